@@ -12,6 +12,7 @@ def add_simple_value(valueName, valueHash, value):
 
 
 def parse_custom_fields(jsc, field_definitions, valueHash):
+	success = True
 	for field_def in field_definitions:
 		split_option = field_def.split('=')
 		if len(split_option) != 2:
@@ -19,7 +20,9 @@ def parse_custom_fields(jsc, field_definitions, valueHash):
 		else:
 			key = split_option[0]
 			value = split_option[1]
-			jsc.add_configured_custom_value(valueHash, key, value)
+			if not jsc.add_configured_custom_value(valueHash, key, value):
+				success = False
+	return success
 
 
 def main():
@@ -60,9 +63,6 @@ def main():
 
 	additional_options = {}
 
-	if len(args) > 0:
-		parse_custom_fields(jsc, args, additional_options)
-
 	jsc.add_hash_value('assignee', 'name', additional_options, options.assignee)
 	jsc.add_hash_value('reporter', 'name', additional_options, options.reporter)
 	jsc.add_hash_value('priority', 'name', additional_options, options.priority)
@@ -92,10 +92,15 @@ def main():
 	#jsc.add_hash_value('customfield_15362', 'value', additional_options, options.security_risk)
 	#jsc.add_hash_value('customfield_15369', 'value', additional_options, options.cost_attribution)
 
-	log.debug('Additional options: %s' % additional_options)
-
 	jc = jsc.connect()
 
+	# Custom fields may be resolved by name, which needs the field index from the server
+	if len(args) > 0 and not parse_custom_fields(jsc, args, additional_options):
+		jsc.disconnect()
+		parser.error('Invalid custom fields, issue was not created!')
+
+	log.debug('Additional options: %s' % additional_options)
+
 	log.debug('Creating issue of type "%s" for project "%s" with summary "%s"...' % (options.type, options.project,
 																					 options.summary))
 	result = jc.create_issue(options.project, options.summary, options.type, additional_options)
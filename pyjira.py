@@ -6,6 +6,7 @@ import logging
 import ConfigParser
 import sys
 import os
+import time
 
 import requests
 
@@ -37,12 +38,134 @@ class JiraResult:
 				self.log.error('%s: %s' % (key, self.json['errors'][key]))
 
 
+class JiraFieldIndex:
+	# Maps field ids and display names to the field definitions returned by /field
+	def __init__(self, log, fields, from_cache=False):
+		self.log = log
+		self.fields = fields
+		self.from_cache = from_cache
+		self.by_id = {}
+		self.by_name = {}
+		self.ambiguous_names = {}
+		for field in fields:
+			self.by_id[field['id']] = field
+			name = self.normalize_name(field['name'])
+			if self.by_name.has_key(name):
+				self.ambiguous_names.setdefault(name, [self.by_name[name]['id']]).append(field['id'])
+			else:
+				self.by_name[name] = field
+
+	@staticmethod
+	def normalize_name(name):
+		return name.lower().replace('-', ' ').replace('_', ' ').strip()
+
+	@classmethod
+	def load(cls, jc, address, log, cache_file, ttl, use_cache=True):
+		if use_cache:
+			fields = cls.read_cache(address, log, cache_file, ttl)
+			if fields is not None:
+				return cls(log, fields, True)
+		log.debug('Retrieving field definitions from server...')
+		result = jc.get_all_fields()
+		if result.is_error():
+			result.log_error('Unable to retrieve field definitions!')
+			return cls(log, [])
+		cls.write_cache(address, log, cache_file, result.json)
+		return cls(log, result.json)
+
+	@staticmethod
+	def read_cache(address, log, cache_file, ttl):
+		if not cache_file or ttl <= 0 or not os.path.isfile(cache_file):
+			return None
+		try:
+			with open(cache_file) as f:
+				cache = json.load(f)
+		except (IOError, ValueError):
+			cache = None
+		if not isinstance(cache, dict) or not isinstance(cache.get('fields'), list):
+			log.warning('Unable to read field cache %s, ignoring it!' % cache_file)
+			return None
+		if cache.get('address') != address:
+			log.debug('Field cache %s belongs to another server, ignoring it.' % cache_file)
+			return None
+		if time.time() - cache.get('timestamp', 0) > ttl:
+			log.debug('Field cache %s is expired.' % cache_file)
+			return None
+		log.debug('Using field definitions from cache %s' % cache_file)
+		return cache['fields']
+
+	@staticmethod
+	def write_cache(address, log, cache_file, fields):
+		if not cache_file:
+			return
+		try:
+			with open(cache_file, 'w') as f:
+				json.dump({'address': address, 'timestamp': time.time(), 'fields': fields}, f)
+		except IOError:
+			log.warning('Unable to write field cache %s!' % cache_file)
+
+	def is_ambiguous(self, name):
+		return not self.by_id.has_key(name) and self.ambiguous_names.has_key(self.normalize_name(name))
+
+	def find(self, name):
+		if self.by_id.has_key(name):
+			return self.by_id[name]
+		normalized_name = self.normalize_name(name)
+		if self.ambiguous_names.has_key(normalized_name):
+			self.log.error('Field name "%s" matches several fields (%s)! Set <key>.name to one of these ids.' % (
+				name, ', '.join(self.ambiguous_names[normalized_name])))
+			return None
+		return self.by_name.get(normalized_name)
+
+	# Returns None if there is nothing to set, raises ValueError if the value is invalid for the field
+	def convert_value(self, field, value, allowed_values=None):
+		schema = field.get('schema', {})
+		type = schema.get('type')
+		if type == 'array':
+			item_type = schema.get('items')
+			values = [v.strip() for v in value.split(',') if v.strip()]
+			if not values:
+				return None
+			return [self.convert_single_value(field, item_type, v, allowed_values) for v in values]
+		if not value:
+			return None
+		return self.convert_single_value(field, type, value, allowed_values)
+
+	def convert_single_value(self, field, type, value, allowed_values=None):
+		if allowed_values and value not in allowed_values:
+			raise ValueError('Value "%s" is not allowed for field %s! Allowed values: %s' % (
+				value, field['name'], ', '.join(allowed_values)))
+		if type == 'user':
+			return {'name': value}
+		elif type == 'option':
+			return {'value': value}
+		elif type in ('version', 'component', 'priority'):
+			return {'name': value}
+		elif type == 'number':
+			try:
+				return float(value)
+			except ValueError:
+				raise ValueError('Value "%s" for field %s is not a number!' % (value, field['name']))
+		elif type == 'date':
+			try:
+				time.strptime(value, '%Y-%m-%d')
+			except ValueError:
+				raise ValueError('Value "%s" for field %s is not a date (YYYY-MM-DD)!' % (value, field['name']))
+			return value
+		else:
+			return value
+
+
 class JiraServerConfiguration:
 	def __init__(self):
 		self.address = None
 		self.username = None
 		self.password = None
 		self.custom_field_configuration = None
+		self.jc = None
+		self.field_index = None
+		self.field_cache_file = '%s/.jiracli-fields' % os.getenv('HOME')
+		self.field_cache_ttl = 86400
 		self.debug = False
 		self.jira_version = '5'
 
@@ -63,6 +186,10 @@ class JiraServerConfiguration:
 				self.debug = config.getboolean('misc', 'debug')
 			except:
 				pass
+			try:
+				self.field_cache_ttl = config.getint('misc', 'fieldCacheTtl')
+			except:
+				pass
 		self.log = self.init_logging(self.debug)
 		self.parse_custom_fields(config)
 
@@ -139,18 +266,61 @@ class JiraServerConfiguration:
 	def get_issue_url(self, issue_key):
 		return "%s/browse/%s" % (self.address, issue_key)
 
+	def get_field_index(self, use_cache=True):
+		if not self.jc:
+			self.log.error('Custom fields can only be resolved by name after connecting to Jira!')
+			sys.exit(1)
+		if not self.field_index or not use_cache:
+			self.field_index = JiraFieldIndex.load(self.jc, self.address, self.log, self.field_cache_file,
+												   self.field_cache_ttl, use_cache)
+		return self.field_index
+
+	def find_field(self, name):
+		field_index = self.get_field_index()
+		field = field_index.find(name)
+		if not field and field_index.from_cache and not field_index.is_ambiguous(name):
+			# The field may have been created or renamed since the cache was written
+			self.log.debug('Field %s not found in cache, reloading field definitions...' % name)
+			field = self.get_field_index(use_cache=False).find(name)
+		return field
+
+	def get_allowed_values(self, config):
+		if config.has_key('values'):
+			return config['values'].split('|')
+		return None
+
+	# Returns False if the value could not be set, so the issue should not be sent
 	def add_configured_custom_value(self, valueHash, key, value):
-		if self.custom_field_configuration.has_key(key):
-			config = self.custom_field_configuration[key]
+		config = self.custom_field_configuration.get(key, {})
+		allowed_values = self.get_allowed_values(config)
+		if config.has_key('type'):
 			type = config['type']
 			if type == 'additionalHash':
+				if value and allowed_values and value not in allowed_values:
+					self.log.error('Value "%s" is not allowed for %s! Allowed values: %s' % (
+						value, key, ', '.join(allowed_values)))
+					return False
 				fieldname = config['fieldname']
 				fieldsubname = config['fieldsubname']
 				self.add_hash_value(fieldname, fieldsubname, valueHash, value)
 			else:
 				self.log.error('Unknown type %s!' % type)
+				return False
 		else:
-			self.log.error('Unable to find custom field definition for %s!' % key)
+			# Resolve by field id or display name (e.g. "security-risk" matches "Security Risk")
+			field = self.find_field(config.get('name', key))
+			if not field:
+				self.log.error('Unable to find custom field definition for %s!' % key)
+				return False
+			try:
+				converted_value = self.get_field_index().convert_value(field, value, allowed_values)
+			except ValueError as e:
+				self.log.error(e)
+				return False
+			if converted_value is not None:
+				self.log.debug('Resolved %s to field %s (%s)' % (key, field['id'], field.get('schema', {})))
+				valueHash[field['id']] = converted_value
+		return True
 
 	def add_hash_value(self, valueName, name, valueHash, value):
 		if value: